@@ -1,14 +1,18 @@
 import asyncio
-import httpx
-import json
+import aiohttp
+import functools
 import logging
-from typing import List, Tuple
+import orjson
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 import os
-import requests
-from bitcoinlib.keys import Key,Address
 import rust_tss as rust_tss
 from bitcoinlib.services.services import Service 
 from bitcoinlib.transactions import Transaction
+try:
+    import uvloop
+except ImportError:  # Optional: fall back to the default asyncio event loop
+    uvloop = None
 # Configure logging
 class CustomFormatter(logging.Formatter):
     def formatTime(self, record, datefmt=None):
@@ -33,35 +37,104 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 logger.addHandler(handler)
 logger.propagate = False  # Avoid double logging if root logger also set
-# Read signer URLs from environment variable
-signer_urls_str = os.getenv("SIGNER_URLS")
-if not signer_urls_str:
-    logger.error("Environment variable SIGNER_URLS is not set.")
-    raise ValueError("SIGNER_URLS is required.")
 
-SIGNERS = signer_urls_str.split(",")
+@functools.lru_cache(maxsize=1)
+def signers() -> Tuple[str, ...]:
+    """
+    Signer base URLs, read once from the SIGNER_URLS environment variable
+    on first use rather than at import time.
+    """
+    signer_urls_str = os.getenv("SIGNER_URLS")
+    if not signer_urls_str:
+        logger.error("Environment variable SIGNER_URLS is not set.")
+        raise ValueError("SIGNER_URLS is required.")
+    return tuple(signer_urls_str.split(","))
+
+# Shared HTTP session, created lazily on first use so keep-alive connections
+# to each signer are reused across DKG rounds and signing rounds.
+_SESSION: Optional[aiohttp.ClientSession] = None
+_HTTP_TIMEOUT = aiohttp.ClientTimeout(total=30)
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+def _get_session() -> aiohttp.ClientSession:
+    global _SESSION
+    # A session is bound to the loop it was created on; each asyncio.run()
+    # starts a new loop, so build a fresh session for it.
+    if _SESSION is None or _SESSION.closed or _SESSION._loop is not asyncio.get_running_loop():
+        # Each round fans out one request per signer, so leave the total pool
+        # unbounded (limit=0) and cap connections per host instead; every
+        # signer stays warm however large the committee is.
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=32, keepalive_timeout=75)
+        _SESSION = aiohttp.ClientSession(connector=connector, timeout=_HTTP_TIMEOUT)
+    return _SESSION
+
+
+async def close_session():
+    """
+    Closes the shared HTTP session. Must be awaited on the event loop that
+    created it, before that loop shuts down.
+    """
+    global _SESSION
+    if _SESSION is not None and not _SESSION.closed:
+        await _SESSION.close()
+    _SESSION = None
+
+
+async def _get_json(url: str):
+    async with _get_session().get(url) as resp:
+        return orjson.loads(await resp.read())
+
 
+async def _post_json(url: str, body=None):
+    """
+    POSTs body as JSON and returns the decoded response. body may also be
+    already-serialized bytes, e.g. a payload shared by several requests.
+    """
+    data = body if body is None or isinstance(body, bytes) else orjson.dumps(body)
+    async with _get_session().post(url, data=data, headers=_JSON_HEADERS) as resp:
+        return orjson.loads(await resp.read())
 
 
+async def _gather_or_cancel(*aws):
+    """
+    Like asyncio.gather, but cancels every awaitable still pending as soon as
+    one of them fails, so no signer request is left running in the background.
+    Same semantics as asyncio.TaskGroup, which needs Python 3.11 (the images
+    run 3.9), except the first error is raised as-is rather than wrapped in
+    an ExceptionGroup.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
 
-async def check_dkg_status(client: httpx.AsyncClient) -> Tuple[bool, str,str]:
+async def check_dkg_status() -> Tuple[bool, str,str]:
     """
     Checks if all signers have existing keys.
     Returns True if all signers have keys, False otherwise.
     """
-    status_tasks = [client.get(f"{signer}/dkg/status") for signer in SIGNERS]
+    status_tasks = [asyncio.ensure_future(_get_json(f"{signer}/dkg/status")) for signer in signers()]
     try:
-        responses = await asyncio.gather(*status_tasks)
-        statuses = [resp.json() for resp in responses]
-        for status in statuses:
+        # Stop at the first signer without keys instead of waiting for the slowest one
+        for next_status in asyncio.as_completed(status_tasks):
+            status = await next_status
             if not status["is_exist"]:
-                logger.info(f"Signer {status['id']} does not have keys. DKG is needed.")
+                logger.info("Signer %s does not have keys. DKG is needed.", status["id"])
                 return (False,"","")
         logger.info("All signers have existing keys. No DKG needed.")
-        return (True,statuses[0]["verify_key_hex"],statuses[0]["pubkp_hex"])
+        status = status_tasks[0].result()
+        return (True,status["verify_key_hex"],status["pubkp_hex"])
     except Exception as e:
-        logger.error(f"Failed to check DKG status: {e}")
+        logger.error("Failed to check DKG status: %s", e)
         raise
+    finally:
+        for task in status_tasks:
+            task.cancel()
 
 
 
@@ -73,146 +146,152 @@ async def run_dkg():
     Orchestrates the DKG process across multiple signer nodes.
     Returns the group verifying key upon completion.
     """
-    async with httpx.AsyncClient() as client:
-        
-        is_exist, verify_key_hex,pubkp = await check_dkg_status(client)
-        if is_exist:
-            logger.info("All signers have keys. No DKG needed.")
-            return verify_key_hex,pubkp
-        logger.info("Starting DKG process...")
+    
+    is_exist, verify_key_hex,pubkp = await check_dkg_status()
+    if is_exist:
+        logger.info("All signers have keys. No DKG needed.")
+        return verify_key_hex,pubkp
+    logger.info("Starting DKG process...")
+
+    # --- Round 1: Collect broadcast packages from all signers ---
+    logger.info("Starting DKG Round 1...")
+    round1_tasks = [_post_json(f"{signer}/dkg/round1") for signer in signers()]
+    try:
+        round1_data = await _gather_or_cancel(*round1_tasks)
+    except Exception as e:
+        logger.error("Round 1 failed: %s", e)
+        raise
 
-        
-        # --- Round 1: Collect broadcast packages from all signers ---
-        logger.info("Starting DKG Round 1...")
-        round1_tasks = [client.post(f"{signer}/dkg/round1") for signer in SIGNERS]
-        try:
-            round1_responses = await asyncio.gather(*round1_tasks)
-            round1_data = [resp.json() for resp in round1_responses]
-        except Exception as e:
-            logger.error(f"Round 1 failed: {e}")
-            raise
-
-        # Extract id and pkg_hex from each response
-        r1_pkgs: List[Tuple[str, str]] = [(data["id_hex"], data["pkg_hex"]) for data in round1_data]
-        logger.info(f"Round 1 completed.")
-        # --- Round 2: Distribute Round 1 packages and collect Round 2 packages ---
-        logger.info("Starting DKG Round 2...")
-        round2_tasks = []
-        for signer, self_id in zip(SIGNERS, [data["id_hex"] for data in round1_data]):
-            # Exclude the signer's own package
-            pkgs_for_signer = [pkg for pkg in r1_pkgs if pkg[0] != self_id]
-            body = {"pkgs_hex": pkgs_for_signer}
-            round2_tasks.append(client.post(f"{signer}/dkg/round2", json=body))
-
-        try:
-            round2_responses = await asyncio.gather(*round2_tasks)
-            round2_data = [resp.json() for resp in round2_responses]
-        except Exception as e:
-            logger.error(f"Round 2 failed: {e}")
-            raise
-
-        # Extract id and pkgs2_json from each response
-        r2_pkgs_json = [(data["id_hex"],data["pkgs2_json"]) for data in round2_data]
-
-        # Parse the JSON strings to get the actual Round 2 packages
-        r2_pkgs: List[Tuple[int, Tuple[int, str]]] = []
-        for sender_id, pkgs_json in r2_pkgs_json:
-            pkgs = json.loads(pkgs_json)  # List of [target_id, pkg_hex]
-            for pkg in pkgs:
-                target_id, pkg_hex = pkg
-                r2_pkgs.append((sender_id, (target_id, pkg_hex)))
-        # logger.info(f"Parsed Round 2 packages: {r2_pkgs}")
-        logger.info(f"Round 2 Completed")
-        
-        
-        
-        # --- Round 3: Distribute Round 1 and Round 2 packages and finalize DKG ---
-        logger.info("Starting DKG Round 3...")
-        round3_tasks = []
-        for signer, self_id in zip(SIGNERS, [data["id_hex"] for data in round1_data]):
-            # All Round 1 packages are sent to every signer
-            r1_pkgs_for_signer = [
-                (sender_id, pkg) for sender_id, pkg in r1_pkgs if sender_id != self_id
-            ]
-            # Filter Round 2 packages intended for this signer
-            r2_pkgs_for_signer = [
-                (sender_id, pkg[1]) for sender_id, pkg in r2_pkgs if pkg[0] == self_id
-            ]
-            body = {
-                "r1_pkgs_hex": r1_pkgs_for_signer,
-                "r2_pkgs_hex": r2_pkgs_for_signer
-            }
-            round3_tasks.append(client.post(f"{signer}/dkg/round3", json=body))
-        try:
-            round3_responses = await asyncio.gather(*round3_tasks)
-            round3_data = [resp.json() for resp in round3_responses]
-        except Exception as e:
-            logger.error(f"Round 3 failed: {e}")
-            raise
+    # Extract id and pkg_hex from each response
+    self_ids = [data["id_hex"] for data in round1_data]
+    # Every Round 1 package in signer order, serialized once and shared by all
+    # signers (each drops its own): sent as-is as the Round 2 body, and
+    # embedded pre-encoded (orjson.Fragment) in each Round 3 body.
+    r1_pkgs = orjson.Fragment(orjson.dumps([(data["id_hex"], data["pkg_hex"]) for data in round1_data]))
+    logger.info("Round 1 completed.")
+    # --- Round 2: Distribute Round 1 packages and collect Round 2 packages ---
+    logger.info("Starting DKG Round 2...")
+    round2_body = orjson.dumps({"pkgs_hex": r1_pkgs})
+    round2_tasks = [_post_json(f"{signer}/dkg/round2", round2_body) for signer in signers()]
+    try:
+        round2_data = await _gather_or_cancel(*round2_tasks)
+    except Exception as e:
+        logger.error("Round 2 failed: %s", e)
+        raise
+
+    # Index Round 2 packages by the signer they are addressed to.
+    # Each pkgs2 is a list of [target_id, pkg_hex].
+    r2_by_target: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+    for data in round2_data:
+        for target_id, pkg_hex in data["pkgs2"]:
+            r2_by_target[target_id].append((data["id_hex"], pkg_hex))
+    logger.info("Round 2 Completed")
+
+    # --- Round 3: Distribute Round 1 and Round 2 packages and finalize DKG ---
+    logger.info("Starting DKG Round 3...")
+    round3_tasks = []
+    for signer, self_id in zip(signers(), self_ids):
+        body = {
+            "r1_pkgs_hex": r1_pkgs,
+            # Round 2 packages intended for this signer
+            "r2_pkgs_hex": r2_by_target[self_id],
+        }
+        round3_tasks.append(_post_json(f"{signer}/dkg/round3", body))
+    try:
+        round3_data = await _gather_or_cancel(*round3_tasks)
+    except Exception as e:
+        logger.error("Round 3 failed: %s", e)
+        raise
+
+    # Extract group verifying key (should be the same for all signers)
+    verify_key_hex = round3_data[0]["verify_key_hex"]
+    pubkp_hex = round3_data[0]["pubkp_hex"]
+    logger.info("DKG completed. Group Verifying Key: %s. Public Key Pkg: %s", verify_key_hex, pubkp_hex)
+
+    return verify_key_hex,pubkp_hex
+
+
+async def sign_round1_gather() -> List[Tuple[str, str]]:
+    """
+    FROST signing Round 1: collects a nonce commitment from every signer.
+    Commitments don't depend on the message, so this can run while the
+    message (e.g. a transaction sighash) is still being prepared.
+    """
+    logger.info("Starting Frost Sign Round 1, sending out to signers...")
+    round1_tasks = [_post_json(f"{signer}/sign/round1") for signer in signers()]
+    round1_data = await _gather_or_cancel(*round1_tasks)
+    round1_commitments = [
+        (data["id"], data["commitment"]) for data in round1_data
+    ]
+    logger.info("Frost Sign Round 1 complete...")
+    return round1_commitments
 
-        # Extract group verifying key (should be the same for all signers)
-        verify_key_hex = round3_data[0]["verify_key_hex"]
-        pubkp_hex = round3_data[0]["pubkp_hex"]
-        logger.info(f"DKG completed. Group Verifying Key: {verify_key_hex}. Public Key Pkg: {pubkp_hex}")
 
-        return verify_key_hex,pubkp_hex
+async def sign_round2_aggregate(message: str, round1_commitments: List[Tuple[str, str]], pubkp_hex: str):
+    """
+    FROST signing Round 2: sends the message and all Round 1 commitments to
+    every signer, then aggregates their signature shares.
+    """
+    logger.info("From the FUnction: Message to sign: %s", message)
+    # --- Round 2: Send commitments + message to each signer
+    logger.info("Starting Frost Sign Round 2, sending out to signers...")
+    # Every signer gets the same body, so serialize it once
+    body = orjson.dumps({
+        "message_hex": message,
+        "commitments": round1_commitments  # All commitments
+    })
+    round2_tasks = [_post_json(f"{signer}/sign/round2", body) for signer in signers()]
+
+    round2_data = await _gather_or_cancel(*round2_tasks)
+    sig_shares = [
+        (data["id"], data["sig_share"]) for data in round2_data
+    ]
+    logger.info("Starting Signature Aggregation...")
+    # --- Coordinator aggregates signature
+    aggregated_sig = await asyncio.to_thread(
+        rust_tss.aggregate_signature, message, sig_shares, round1_commitments, pubkp_hex
+    )
+    logger.info("Aggregated Schnorr Signature: %s", aggregated_sig)
+    return aggregated_sig
 
 
 async def coordinate_frost_sign(message: str, pubkp_hex: str):
+    # --- Round 1: Get commitments from each signer
+    round1_commitments = await sign_round1_gather()
+    return await sign_round2_aggregate(message, round1_commitments, pubkp_hex)
 
-    logger.info(f"From the FUnction: Message to sign: {message}")
-    async with httpx.AsyncClient() as client:
-        # --- Round 1: Get commitments from each signer
-        logger.info("Starting Frost Sign Round 1, sending out to signers...")
-        round1_tasks = [client.post(f"{signer}/sign/round1") for signer in SIGNERS]
-        round1_responses = await asyncio.gather(*round1_tasks)
-        round1_commitments = [
-            (resp.json()["id"], resp.json()["commitment"]) for resp in round1_responses
-        ]
-        logger.info("Frost Sign Round 1 complete...")
-        # --- Round 2: Send commitments + message to each signer
-        logger.info("Starting Frost Sign Round 2, sending out to signers...")
-        round2_tasks = []
-        for signer, (sid, _) in zip(SIGNERS, round1_commitments):
-            body = {
-                "message_hex": message,
-                "commitments": round1_commitments  # All commitments
-            }
-            round2_tasks.append(client.post(f"{signer}/sign/round2", json=body))
-
-        round2_responses = await asyncio.gather(*round2_tasks)
-        sig_shares = [
-            (resp.json()["id"], resp.json()["sig_share"]) for resp in round2_responses
-        ]
-        logger.info("Starting Signature Aggregation...")
-        # --- Coordinator aggregates signature
-        aggregated_sig = rust_tss.aggregate_signature(message, sig_shares, round1_commitments, pubkp_hex)
-        logger.info(f"Aggregated Schnorr Signature: {aggregated_sig}")
-        return aggregated_sig
-
-def broadcast_tx(tx_hex: str, network: str = "testnet") -> str:
+@functools.lru_cache(maxsize=8)
+def _service(network: str) -> Service:
+    # Service setup does provider lookup; build it once per network
+    return Service(network=network)
+
+
+async def broadcast_tx(tx_hex: str, network: str = "testnet") -> str:
     """
     Broadcast the signed transaction using Bitcoinlib.
+    Bitcoinlib is blocking, so the call runs in a worker thread.
     """
-    service = Service(network=network)
-    txid = service.sendrawtransaction(tx_hex)
-    logger.info(f"Broadcasted transaction. TXID: {txid}")
+    service = _service(network)
+    txid = await asyncio.to_thread(service.sendrawtransaction, tx_hex)
+    logger.info("Broadcasted transaction. TXID: %s", txid)
     return txid
 
-def broadcast_tx_mempool(tx_hex: str):
+async def broadcast_tx_mempool(tx_hex: str):
     url = "https://mempool.space/testnet/api/tx"
     headers = {"Content-Type": "text/plain"}
-    response = requests.post(url, data=tx_hex, headers=headers)
-    
-    if response.status_code != 200:
-        raise Exception(f"Broadcast failed: {response.text}")
+    async with _get_session().post(url, data=tx_hex, headers=headers) as response:
+        text = await response.text()
+
+    if response.status != 200:
+        raise Exception(f"Broadcast failed: {text}")
     
-    txid = response.text.strip()
+    txid = text.strip()
     return txid
 
-def fetch_fee_rate(network='testnet', priority='medium') -> int:
+async def fetch_fee_rate(network='testnet', priority='medium') -> int:
     """
     Fetch estimated fee rate (sats/vbyte) using bitcoinlib's estimatefee.
+    Bitcoinlib is blocking, so the call runs in a worker thread.
     
     Args:
         network (str): 'mainnet' | 'testnet' etc
@@ -221,8 +300,8 @@ def fetch_fee_rate(network='testnet', priority='medium') -> int:
     Returns:
         int: fee rate in sats/vbyte
     """
-    service = Service(network=network)
-    fee_per_kb = service.estimatefee(priority=priority)
+    service = _service(network)
+    fee_per_kb = await asyncio.to_thread(service.estimatefee, priority=priority)
 
     if not isinstance(fee_per_kb, int):
         raise ValueError(f"Invalid fee estimation response: {fee_per_kb}")
@@ -248,33 +327,29 @@ def decode_signed_tx(signed_tx_hex: str):
     """
     tx = Transaction.import_raw(signed_tx_hex)
     
-    decoded = {
+    return {
         "version": tx.version,
         "locktime": tx.locktime,
-        "inputs": [],
-        "outputs": [],
+        "inputs": [
+            {
+                "prev_txid": inp.txid,
+                "vout": inp.txindex,
+                "script_sig": inp.script,
+                "sequence": inp.sequence,
+            }
+            for inp in tx.inputs
+        ],
+        "outputs": [
+            {
+                "value_satoshi": outp.value,
+                "address": outp.address,
+                "script_pubkey": outp.script,
+            }
+            for outp in tx.outputs
+        ],
         "txid": tx.txid,
     }
 
-    # Parse inputs
-    for inp in tx.inputs:
-        decoded["inputs"].append({
-            "prev_txid": inp.txid,
-            "vout": inp.txindex,
-            "script_sig": inp.script,
-            "sequence": inp.sequence,
-        })
-
-    # Parse outputs
-    for outp in tx.outputs:
-        decoded["outputs"].append({
-            "value_satoshi": outp.value,
-            "address": outp.address,
-            "script_pubkey": outp.script,
-        })
-    
-    return decoded
-
 async def propose_tx_and_sign(
     utxo_txid: str,
     utxo_vout: int,
@@ -307,40 +382,51 @@ async def propose_tx_and_sign(
     fee_rate = 2
     if fee_rate == 0:
         fee_rate = 5  # Fallback minimum fee rate
-    logger.info(f"Estimated fee rate: {fee_rate} sats/vbyte")
+    logger.info("Estimated fee rate: %d sats/vbyte", fee_rate)
 
 
     logger.info("Preparing unsigned transaction and sighash...")
-    tx_hex, sighash_hex = rust_tss.prepare_unsigned_tx_and_sighash(
-        utxo_txid,
-        utxo_vout,
-        utxo_value,
-        prev_spk_hex,
-        to_address,
-        send_value,
-        fee_rate,
-        change_address,
-        network
+    # Signing Round 1 doesn't need the sighash, so collect commitments while
+    # the transaction is built. Rust FFI calls block, so keep them off the
+    # event loop.
+    (tx_hex, sighash_hex), round1_commitments = await _gather_or_cancel(
+        asyncio.to_thread(
+            rust_tss.prepare_unsigned_tx_and_sighash,
+            utxo_txid,
+            utxo_vout,
+            utxo_value,
+            prev_spk_hex,
+            to_address,
+            send_value,
+            fee_rate,
+            change_address,
+            network
+        ),
+        sign_round1_gather(),
     )
 
     logger.info("Starting FROST signing over sighash...")
-    logger.info(f"Transaction Hex: {tx_hex}")
-    logger.info(f"Sighash Hex: {sighash_hex}")
-    sig_hex = await coordinate_frost_sign(sighash_hex, pubkp_hex)
+    logger.info("Transaction Hex: %s", tx_hex)
+    logger.info("Sighash Hex: %s", sighash_hex)
+    sig_hex = await sign_round2_aggregate(sighash_hex, round1_commitments, pubkp_hex)
 
     logger.info("Finalizing the signed transaction...")
-    signed_tx_hex = rust_tss.finalize_signed_tx_from_hex(tx_hex, sig_hex)
+    signed_tx_hex = await asyncio.to_thread(rust_tss.finalize_signed_tx_from_hex, tx_hex, sig_hex)
 
     return signed_tx_hex
 
 
 
 
-if __name__ == "__main__":
+async def main():
+    """
+    Runs DKG (and optionally signing) inside a single event loop so the shared
+    HTTP session is reused throughout and closed once at the end.
+    """
     try:
-        group_vk_hex,pubkp_hex = asyncio.run(run_dkg())
+        group_vk_hex,pubkp_hex = await run_dkg()
         taproot_address = rust_tss.derive_taproot_address(group_vk_hex, "testnet")
-        logger.info(f"Taproot Address:{taproot_address}")
+        logger.info("Taproot Address:%s", taproot_address)
         
         
         
@@ -371,24 +457,31 @@ if __name__ == "__main__":
         # send_value = <AMOUNT_TO_SEND_IN_SATS>
         # change_address = "<YOUR_CHANGE_ADDRESS>"
         # network = "<NETWORK_NAME>"  # e.g., "testnet" or "mainnet"
-        # logger.info(f"Preparing to propose transaction with UTXO {utxo_txid}:{utxo_vout} of value {utxo_value} sats")
-        # signed_tx_hex = asyncio.run(
-        #     propose_tx_and_sign(
-        #         utxo_txid,
-        #         utxo_vout,
-        #         utxo_value,
-        #         prev_spk_hex,
-        #         to_address,
-        #         send_value,
-        #         change_address,
-        #         network,
-        #         pubkp_hex
-        #     )
+        # logger.info("Preparing to propose transaction with UTXO %s:%s of value %s sats", utxo_txid, utxo_vout, utxo_value)
+        # signed_tx_hex = await propose_tx_and_sign(
+        #     utxo_txid,
+        #     utxo_vout,
+        #     utxo_value,
+        #     prev_spk_hex,
+        #     to_address,
+        #     send_value,
+        #     change_address,
+        #     network,
+        #     pubkp_hex
         # )
-        # logger.info(f"Signed Transaction Hex:{signed_tx_hex}")
-        # txid = broadcast_tx_mempool(signed_tx_hex)
-        # logger.info(f"Broadcasted TXID:{txid}")
+        # logger.info("Signed Transaction Hex:%s", signed_tx_hex)
+        # txid = await broadcast_tx_mempool(signed_tx_hex)
+        # logger.info("Broadcasted TXID:%s", txid)
         
+    finally:
+        await close_session()
+
+
+if __name__ == "__main__":
+    if uvloop is not None:
+        uvloop.install()
+    try:
+        asyncio.run(main())
     except Exception as e:
-        logger.error(f"DKG process failed: {e}")
+        logger.error("DKG process failed: %s", e)
         raise
\ No newline at end of file
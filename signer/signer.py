@@ -1,10 +1,13 @@
 import os
-import json
-import hashlib
-from typing import List, Tuple # Import these
+import asyncio
+from typing import List, Optional, Tuple # Import these
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel # Import BaseModel
 import logging
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
 # Assuming your compiled rust lib is importable as rust_ffi
 import rust_tss as rust_tss
@@ -25,21 +28,72 @@ try:
     if PID == 0: # Basic validation based on Rust constraints
          raise ValueError("PARTY_ID cannot be zero")
 except KeyError as e:
-    logger.error(f"Missing environment variable: {e}")
+    logger.error("Missing environment variable: %s", e)
     exit(1)
 except ValueError as e:
-     logger.error(f"Invalid environment variable (PARTY_ID must be > 0, N, T must be integers): {e}")
+     logger.error("Invalid environment variable (PARTY_ID must be > 0, N, T must be integers): %s", e)
      exit(1)
 
-logger.info(f"Party ID (u16): {PID}")
-logger.info(f"DKG Config: T={T}, N={N}")
+logger.info("Party ID (u16): %s", PID)
+logger.info("DKG Config: T=%s, N=%s", T, N)
 
-app = FastAPI()
+class OrjsonResponse(JSONResponse):
+    # Encode response bodies with orjson instead of the stdlib json module.
+    # (FastAPI's own ORJSONResponse is deprecated in recent releases.)
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+# --- Helper for running Rust FFI calls off the event loop ---
+# A single worker keeps Rust calls serialized (as they were when made directly
+# on the event loop) while the loop stays free to serve other requests.
+_RUST_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rust_tss")
+
+async def run_rust(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_RUST_EXECUTOR, fn, *args)
+
+
+# --- Participant identifier ---
+# Hex-encoded FROST identifier for PID. It never changes for this process, so
+# it is stored from the first Rust call that returns it (rust_tss.init or
+# rust_tss.dkg_round1) instead of requiring /dkg/status to be hit first.
+_ID_HEX: Optional[str] = None
+
+async def pid_hex() -> str:
+    global _ID_HEX
+    if _ID_HEX is None:
+        # Nothing has returned the id yet; derive it on the Rust executor
+        _ID_HEX = (await run_rust(rust_tss.init, PID))[3]
+    return _ID_HEX
+
+
+# --- Startup ---
+# Cached result of rust_tss.init: (is_exists, verify_key_hex, pubkp_hex, id_hex).
+# Filled at startup, cleared when a new DKG starts and refreshed after a
+# successful Round 3, so status polls don't hit sled.
+_STATUS_CACHE = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _STATUS_CACHE, _ID_HEX
+    # Open sled and load any existing keys once at startup, so the first
+    # status or DKG request doesn't pay for it. The identifier is kept on its
+    # own, since Round 1 clears the status cache but never changes the id.
+    try:
+        _STATUS_CACHE = await run_rust(rust_tss.init, PID)
+        _ID_HEX = _STATUS_CACHE[3]
+    except Exception as e:
+        logger.error("Startup init failed, retrying on /dkg/status: %s", e)
+    yield
+
+
+app = FastAPI(default_response_class=OrjsonResponse, lifespan=lifespan)
 
 
 # --- Helper function for error handling ---
 def handle_rust_error(e: Exception, context: str):
-     logger.error(f"Error during {context}: {e}")
+     logger.error("Error during %s: %s", context, e)
      # Check if it's a PyO3 mapped exception or a base Python one
      if isinstance(e, (RuntimeError, ValueError, ConnectionError, OSError, SystemError)): # SystemError might map from some panics
          raise HTTPException(status_code=500, detail=f"Internal Server Error: {context}: {e}")
@@ -56,11 +110,6 @@ class DkgRound3Body(BaseModel):
     r1_pkgs_hex: List[Tuple[str, str]] # List of (pid_u16, pkg_hex)
     r2_pkgs_hex: List[Tuple[str, str]] # List of (pid_u16, pkg_hex)
 
-# Optional: Model for init endpoint if you add it
-class InitBody(BaseModel):
-    key_package_hex: str
-    public_key_package_hex: str
-    
 # --- Models for Signing ---
 class SigningRound2Body(BaseModel):
     message_hex: str
@@ -71,17 +120,19 @@ class SigningRound2Body(BaseModel):
 # ------- Check Key Existence Endpoint --------
 @app.get("/dkg/status")
 async def dkg_status():
-    global PID_HEX
-    logger.info(f"[{PID}] Received request for /dkg/status")
+    global _STATUS_CACHE, _ID_HEX
+    logger.info("[%s] Received request for /dkg/status", PID)
     try:
-        # Call Rust FFI with integer PID
-        is_exists,verify_key_hex,pubkp,id_hex = rust_tss.init(PID)
-        PID_HEX = id_hex
+        if _STATUS_CACHE is None:
+            # Call Rust FFI with integer PID
+            _STATUS_CACHE = await run_rust(rust_tss.init, PID)
+        is_exists,verify_key_hex,pubkp,id_hex = _STATUS_CACHE
+        _ID_HEX = id_hex
         if is_exists:
-            # logger.info(f"[{PID}] Keys exist. Verifying Key: {verify_key_hex}")
+            # logger.info("[%s] Keys exist. Verifying Key: %s", PID, verify_key_hex)
             return {"id": PID, "is_exist":is_exists,"verify_key_hex": verify_key_hex,"pubkp_hex": pubkp,"id_hex":id_hex}
         else:
-            logger.info(f"[{PID}] Keys do not exist.")
+            logger.info("[%s] Keys do not exist.", PID)
             return {"id": PID, "is_exist":is_exists,"verify_key_hex": verify_key_hex,"pubkp_hex": pubkp,"id_hex":id_hex}
     except Exception as e:
          handle_rust_error(e, "DKG Status Check")
@@ -90,17 +141,18 @@ async def dkg_status():
 # ------- Round-1 Endpoint --------
 @app.post("/dkg/round1")
 async def dkg_round1_endpoint():
-    global PID_HEX
+    global _STATUS_CACHE, _ID_HEX
 
-    logger.info(f"[{PID}] Received request for /dkg/round1")
+    logger.info("[%s] Received request for /dkg/round1", PID)
     try:
         # Call Rust FFI with integer PID
         # Rust dkg_round1 now returns single string: bcast_pkg_hex
-        _PID_HEX,bcast_pkg_hex = rust_tss.dkg_round1(PID, N, T)
-        PID_HEX = _PID_HEX
-        logger.info(f"[{PID}] DKG Round 1 successful.")
+        _PID_HEX,bcast_pkg_hex = await run_rust(rust_tss.dkg_round1, PID, N, T)
+        _ID_HEX = _PID_HEX
+        _STATUS_CACHE = None
+        logger.info("[%s] DKG Round 1 successful.", PID)
         # Return structure contains integer PID
-        return {"id_hex": PID_HEX, "pkg_hex": bcast_pkg_hex}
+        return {"id_hex": _PID_HEX, "pkg_hex": bcast_pkg_hex}
     except Exception as e:
         handle_rust_error(e, "DKG Round 1")
 
@@ -108,18 +160,21 @@ async def dkg_round1_endpoint():
 # ------- Round-2 Endpoint --------
 @app.post("/dkg/round2")
 async def dkg_round2_endpoint(body: DkgRound2Body):
-    logger.info(f"[{PID}] Received request for /dkg/round2 with {len(body.pkgs_hex)} packages.")
+    logger.info("[%s] Received request for /dkg/round2 with %d packages.", PID, len(body.pkgs_hex))
     if not body.pkgs_hex:
          raise HTTPException(status_code=400, detail="Missing 'pkgs_hex' in request body")
     try:
+        # The coordinator sends every Round 1 package; drop our own
+        self_id = await pid_hex()
+        r1_pkgs_hex = [pkg for pkg in body.pkgs_hex if pkg[0] != self_id]
         # Pass integer PIDs and packages directly to Rust
         # Rust returns JSON string: '[ [pid_u16, pkg2_hex], ... ]'
-        pkgs2_json_str = rust_tss.dkg_round2(PID_HEX, body.pkgs_hex)
-        # logger.info(f"TESTING!!!!!! [{PID}] DKG Round 2 successful. Packages: {pkgs2_json_str}")
-        logger.info(f"[{PID}] DKG Round 2 successful.")
-        # Return JSON string containing list of [pid_u16, pkg2_hex]
-        # Client/Orchestrator needs to json.loads() this string
-        return {"id_hex": PID_HEX, "pkgs2_json": pkgs2_json_str}
+        pkgs2_json_str = await run_rust(rust_tss.dkg_round2, self_id, r1_pkgs_hex)
+        # logger.info("TESTING!!!!!! [%s] DKG Round 2 successful. Packages: %s", PID, pkgs2_json_str)
+        logger.info("[%s] DKG Round 2 successful.", PID)
+        # Embed Rust's JSON list of [pid_u16, pkg2_hex] as-is (no decode and
+        # re-encode here), so the orchestrator gets a plain list in one parse
+        return OrjsonResponse({"id_hex": self_id, "pkgs2": orjson.Fragment(pkgs2_json_str)})
     except Exception as e:
         handle_rust_error(e, "DKG Round 2")
 
@@ -127,20 +182,26 @@ async def dkg_round2_endpoint(body: DkgRound2Body):
 # ------- Round-3 Endpoint --------
 @app.post("/dkg/round3")
 async def dkg_round3_endpoint(body: DkgRound3Body):
-    logger.info(f"[{PID}] Received request for /dkg/round3.")
+    global _STATUS_CACHE
+    logger.info("[%s] Received request for /dkg/round3.", PID)
     if not body.r1_pkgs_hex or not body.r2_pkgs_hex:
          raise HTTPException(status_code=400, detail="Missing 'r1_pkgs_hex' or 'r2_pkgs_hex' in request body")
     try:
+        # The coordinator sends every Round 1 package; drop our own
+        self_id = await pid_hex()
+        r1_pkgs_hex = [pkg for pkg in body.r1_pkgs_hex if pkg[0] != self_id]
         # Pass integer PIDs and packages directly to Rust
         # Rust returns (kp_hex, pubkp_hex, verify_key_hex)
-        _pubkp_hex,_verify_key_hex  = rust_tss.dkg_round3(
-            PID_HEX,
-            body.r1_pkgs_hex,
+        _pubkp_hex,_verify_key_hex  = await run_rust(
+            rust_tss.dkg_round3,
+            self_id,
+            r1_pkgs_hex,
             body.r2_pkgs_hex
         )
         # Persistence is handled by Rust/sled. No file writing here.
-        logger.info(f"[{PID}] DKG Round 3 successful. Keys persisted in Rust/sled.")
-        logger.info(f"[{PID}] Group public key pkg hash Verifying Key (x-only hex): {_verify_key_hex}")
+        _STATUS_CACHE = (True, _verify_key_hex, _pubkp_hex, self_id)
+        logger.info("[%s] DKG Round 3 successful. Keys persisted in Rust/sled.", PID)
+        logger.info("[%s] Group public key pkg hash Verifying Key (x-only hex): %s", PID, _verify_key_hex)
         # Return the final group verifying key (needed for address generation)
         return {"id": PID, "verify_key_hex": _verify_key_hex,"pubkp_hex": _pubkp_hex}
     except Exception as e:
@@ -151,11 +212,12 @@ async def dkg_round3_endpoint(body: DkgRound3Body):
 @app.post("/sign/round1")
 async def signing_round1():
     try:
-        logger.info(f"[{PID}] Received request for /sign/round1")
-        commitments_hex = rust_tss.sign_round1(PID_HEX)
-        logger.info(f"[{PID}] Frost signing Round 1 successful.")
+        logger.info("[%s] Received request for /sign/round1", PID)
+        self_id = await pid_hex()
+        commitments_hex = await run_rust(rust_tss.sign_round1, self_id)
+        logger.info("[%s] Frost signing Round 1 successful.", PID)
         # Return structure contains PID
-        return {"id": PID_HEX, "commitment": commitments_hex}
+        return {"id": self_id, "commitment": commitments_hex}
     except Exception as e:
         handle_rust_error(e, "Signing Round 1")
 
@@ -165,10 +227,11 @@ async def signing_round2(body: SigningRound2Body):
         is_valid = dummy_verify(body.message_hex)
         if not is_valid:
             raise HTTPException(status_code=400, detail="Invalid message hex, potentially malformed transaction, decline to sign.")
-        logger.info(f"[{PID}] Received request for /sign/round2")
-        sig_share_hex = rust_tss.sign_round2(PID_HEX, body.message_hex, body.commitments)
-        logger.info(f"[{PID}] Frost signing Round 2 successful.")
-        return {"id": PID_HEX, "sig_share": sig_share_hex}
+        logger.info("[%s] Received request for /sign/round2", PID)
+        self_id = await pid_hex()
+        sig_share_hex = await run_rust(rust_tss.sign_round2, self_id, body.message_hex, body.commitments)
+        logger.info("[%s] Frost signing Round 2 successful.", PID)
+        return {"id": self_id, "sig_share": sig_share_hex}
     except Exception as e:
         handle_rust_error(e, "Signing Round 2")
         